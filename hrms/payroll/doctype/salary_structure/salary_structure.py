@@ -2,6 +2,8 @@
 # License: GNU General Public License v3. See license.txt
 
 import re
+from functools import lru_cache
+from itertools import chain
 
 import frappe
 from frappe import _
@@ -13,12 +15,63 @@ import erpnext
 
 from hrms.payroll.utils import sanitize_expression
 
+try:
+	import ahocorasick
+except ImportError:
+	# multi-pattern scanning falls back to a regex alternation
+	ahocorasick = None
+
+
+@lru_cache(maxsize=1024)
+def get_payment_days_pattern(abbreviations: tuple) -> re.Pattern:
+	"""Return a compiled pattern matching any of the given abbreviations as whole words.
+
+	Cached module-wide since the same abbreviations recur across salary structures.
+	"""
+	return re.compile(r"\b(?:" + "|".join(map(re.escape, abbreviations)) + r")\b")
+
+
+@lru_cache(maxsize=1024)
+def get_payment_days_automaton(abbreviations: tuple) -> "ahocorasick.Automaton":
+	automaton = ahocorasick.Automaton()
+	for abbr in abbreviations:
+		automaton.add_word(abbr, abbr)
+	automaton.make_automaton()
+	return automaton
+
+
+def formula_contains_abbreviation(formula: str, abbreviations: tuple) -> bool:
+	"""Check whether the formula references any of the abbreviations as a whole word.
+
+	Uses an Aho-Corasick automaton when pyahocorasick is available, giving a
+	deterministic single pass over the formula even with many overlapping
+	abbreviations (e.g. "HR" and "HRA"); otherwise scans with the cached
+	alternation regex.
+	"""
+	if ahocorasick is None:
+		return bool(get_payment_days_pattern(abbreviations).search(formula))
+
+	for end, abbr in get_payment_days_automaton(abbreviations).iter(formula):
+		start = end - len(abbr) + 1
+		# the automaton matches substrings, so reapply the \b word-boundary check
+		if (start == 0 or not (formula[start - 1].isalnum() or formula[start - 1] == "_")) and (
+			end == len(formula) - 1 or not (formula[end + 1].isalnum() or formula[end + 1] == "_")
+		):
+			return True
+
+	return False
+
 
 class SalaryStructure(Document):
 	def before_validate(self):
 		self.sanitize_condition_and_formula_fields()
 
 	def validate(self):
+		# several validators below walk earnings and deductions row by row;
+		# build the (table, row) list once so they share a single traversal
+		self._component_rows = [
+			(table, row) for table in ("earnings", "deductions") for row in self.get(table)
+		]
 		self.set_missing_values()
 		self.validate_amount()
 		self.validate_max_benefits_with_flexi()
@@ -31,21 +84,26 @@ class SalaryStructure(Document):
 		self.reset_condition_and_formula_fields()
 
 	def validate_formula_setup(self):
-		for table in ["earnings", "deductions"]:
-			for row in self.get(table):
-				if not row.amount_based_on_formula and row.formula:
-					frappe.msgprint(
-						_(
-							"{0} Row #{1}: Formula is set but {2} is disabled for the Salary Component {3}."
-						).format(
-							table.capitalize(),
-							row.idx,
-							frappe.bold(_("Amount Based on Formula")),
-							frappe.bold(row.salary_component),
-						),
-						title=_("Warning"),
-						indicator="orange",
-					)
+		offending_rows = [
+			_("{0} Row #{1}: Salary Component {2}").format(
+				table.capitalize(), row.idx, frappe.bold(row.salary_component)
+			)
+			for table, row in self._component_rows
+			if not row.amount_based_on_formula and row.formula
+		]
+
+		if offending_rows:
+			# one consolidated message instead of one msgprint per offending row
+			frappe.msgprint(
+				_("Formula is set but {0} is disabled for the following rows:").format(
+					frappe.bold(_("Amount Based on Formula"))
+				)
+				+ "<ul><li>"
+				+ "</li><li>".join(offending_rows)
+				+ "</li></ul>",
+				title=_("Warning"),
+				indicator="orange",
+			)
 
 	def set_missing_values(self):
 		overwritten_fields = [
@@ -55,25 +113,36 @@ class SalaryStructure(Document):
 			"is_flexible_benefit",
 		]
 		overwritten_fields_if_missing = ["amount_based_on_formula", "formula", "amount"]
-		for table in ["earnings", "deductions"]:
-			for d in self.get(table):
-				component_default_value = frappe.db.get_value(
-					"Salary Component",
-					cstr(d.salary_component),
-					overwritten_fields + overwritten_fields_if_missing,
-					as_dict=1,
-				)
-				if component_default_value:
-					for fieldname in overwritten_fields:
-						value = component_default_value.get(fieldname)
-						if d.get(fieldname) != value:
-							d.set(fieldname, value)
 
-					if not (d.get("amount") or d.get("formula")):
-						for fieldname in overwritten_fields_if_missing:
-							d.set(fieldname, component_default_value.get(fieldname))
+		component_names = {cstr(row.salary_component) for _table, row in self._component_rows}
+		# max_benefit_amount rides along so later validators can read from
+		# this cache instead of issuing their own queries
+		self._component_cache = {
+			row.name: row
+			for row in frappe.get_all(
+				"Salary Component",
+				filters={"name": ("in", list(component_names))},
+				fields=["name", "max_benefit_amount"] + overwritten_fields + overwritten_fields_if_missing,
+			)
+		}
+
+		for _table, d in self._component_rows:
+			component_default_value = self._component_cache.get(cstr(d.salary_component))
+			if component_default_value:
+				for fieldname in overwritten_fields:
+					value = component_default_value.get(fieldname)
+					if d.get(fieldname) != value:
+						d.set(fieldname, value)
+
+				if not (d.get("amount") or d.get("formula")):
+					for fieldname in overwritten_fields_if_missing:
+						d.set(fieldname, component_default_value.get(fieldname))
 
 	def validate_component_based_on_tax_slab(self):
+		# most structures have no tax-slab-based deductions
+		if not any(row.variable_based_on_taxable_salary for row in self.deductions):
+			return
+
 		for row in self.deductions:
 			if row.variable_based_on_taxable_salary and (row.amount or row.formula):
 				frappe.throw(
@@ -88,53 +157,63 @@ class SalaryStructure(Document):
 
 	def validate_payment_days_based_dependent_component(self):
 		abbreviations = self.get_component_abbreviations()
-		for component_type in ("earnings", "deductions"):
-			for row in self.get(component_type):
-				if (
-					row.formula
-					and row.depends_on_payment_days
-					# check if the formula contains any of the payment days components
-					and any(re.search(r"\b" + abbr + r"\b", row.formula) for abbr in abbreviations)
-				):
-					message = _("Row #{0}: The {1} Component has the options {2} and {3} enabled.").format(
-						row.idx,
-						frappe.bold(row.salary_component),
-						frappe.bold(_("Amount based on formula")),
-						frappe.bold(_("Depends On Payment Days")),
-					)
-					message += "<br><br>" + _(
-						"Disable {0} for the {1} component, to prevent the amount from being deducted twice, as its formula already uses a payment-days-based component."
-					).format(frappe.bold(_("Depends On Payment Days")), frappe.bold(row.salary_component))
-					frappe.throw(message, title=_("Payment Days Dependency"))
+		if not abbreviations:
+			return
 
-	def get_component_abbreviations(self):
-		abbr = [d.abbr for d in self.earnings if d.depends_on_payment_days]
-		abbr += [d.abbr for d in self.deductions if d.depends_on_payment_days]
+		# sorted tuple so equivalent structures share a cache entry
+		abbreviations = tuple(sorted(set(abbreviations)))
+
+		# row-independent, so translate and wrap them once
+		amount_based_on_formula = frappe.bold(_("Amount based on formula"))
+		depends_on_payment_days = frappe.bold(_("Depends On Payment Days"))
+		title = _("Payment Days Dependency")
+
+		for _table, row in self._component_rows:
+			if not row.formula or not row.depends_on_payment_days:
+				continue
 
-		return abbr
+			# check if the formula contains any of the payment days components
+			if formula_contains_abbreviation(row.formula, abbreviations):
+				salary_component = frappe.bold(row.salary_component)
+				message = _("Row #{0}: The {1} Component has the options {2} and {3} enabled.").format(
+					row.idx,
+					salary_component,
+					amount_based_on_formula,
+					depends_on_payment_days,
+				)
+				message += "<br><br>" + _(
+					"Disable {0} for the {1} component, to prevent the amount from being deducted twice, as its formula already uses a payment-days-based component."
+				).format(depends_on_payment_days, salary_component)
+				frappe.throw(message, title=title)
+
+	def get_component_abbreviations(self):
+		return [d.abbr for d in chain(self.earnings, self.deductions) if d.depends_on_payment_days]
 
 	def validate_timesheet_component(self):
 		if not self.salary_slip_based_on_timesheet:
 			return
 
-		for component in self.earnings:
-			if component.salary_component == self.salary_component:
-				frappe.msgprint(
-					_(
-						"Row #{0}: Timesheet amount will overwrite the Earning component amount for the Salary Component {1}"
-					).format(self.idx, frappe.bold(self.salary_component)),
-					title=_("Warning"),
-					indicator="orange",
-				)
-				break
+		match = next(
+			(component for component in self.earnings if component.salary_component == self.salary_component),
+			None,
+		)
+		if match is None:
+			return
+
+		frappe.msgprint(
+			_(
+				"Row #{0}: Timesheet amount will overwrite the Earning component amount for the Salary Component {1}"
+			).format(match.idx, frappe.bold(self.salary_component)),
+			title=_("Warning"),
+			indicator="orange",
+		)
 
 	def sanitize_condition_and_formula_fields(self):
-		for table in ("earnings", "deductions"):
-			for row in self.get(table):
-				row.condition = row.condition.strip() if row.condition else ""
-				row.formula = row.formula.strip() if row.formula else ""
-				row._condition, row.condition = row.condition, sanitize_expression(row.condition)
-				row._formula, row.formula = row.formula, sanitize_expression(row.formula)
+		for row in chain(self.earnings, self.deductions):
+			condition = row.condition.strip() if row.condition else ""
+			formula = row.formula.strip() if row.formula else ""
+			row._condition, row.condition = condition, sanitize_expression(condition)
+			row._formula, row.formula = formula, sanitize_expression(formula)
 
 	def reset_condition_and_formula_fields(self):
 		# set old values (allowing multiline strings for better readability in the doctype form)
@@ -146,16 +225,24 @@ class SalaryStructure(Document):
 		self.db_update_all()
 
 	def validate_max_benefits_with_flexi(self):
+		# nothing to validate without flexible benefits or max benefits
+		if not any(row.is_flexible_benefit == 1 for row in self.earnings) and flt(self.max_benefits) == 0:
+			return
+
 		have_a_flexi = False
 		if self.earnings:
 			flexi_amount = 0
-			for earning_component in self.earnings:
-				if earning_component.is_flexible_benefit == 1:
-					have_a_flexi = True
-					max_of_component = frappe.db.get_value(
-						"Salary Component", earning_component.salary_component, "max_benefit_amount"
-					)
-					flexi_amount += max_of_component
+			flexi_components = [
+				earning_component.salary_component
+				for earning_component in self.earnings
+				if earning_component.is_flexible_benefit == 1
+			]
+			if flexi_components:
+				have_a_flexi = True
+				flexi_amount = sum(
+					flt(self._component_cache.get(cstr(name), {}).get("max_benefit_amount"))
+					for name in flexi_components
+				)
 
 			if have_a_flexi and flt(self.max_benefits) == 0:
 				frappe.throw(_("Max benefits should be greater than zero to dispense benefits"))
@@ -171,21 +258,10 @@ class SalaryStructure(Document):
 			)
 
 	def get_employees(self, **kwargs):
-		conditions, values = [], []
-		for field, value in kwargs.items():
-			if value:
-				conditions.append(f"{field}=%s")
-				values.append(value)
-
-		condition_str = " and " + " and ".join(conditions) if conditions else ""
-
-		# nosemgrep: frappe-semgrep-rules.rules.frappe-using-db-sql
-		employees = frappe.db.sql_list(
-			f"select name from tabEmployee where status='Active' {condition_str}",
-			tuple(values),
-		)
+		filters = {"status": "Active"}
+		filters.update({field: value for field, value in kwargs.items() if value})
 
-		return employees
+		return frappe.get_all("Employee", filters=filters, pluck="name")
 
 	@frappe.whitelist()
 	def assign_salary_structure(
@@ -272,7 +348,7 @@ def assign_salary_structure_for_employees(
 			)
 			assignments.append(assignment)
 			frappe.publish_progress(
-				count * 100 / len(set(employees) - set(existing_assignments_for)),
+				count * 100 / len(set(employees) - existing_assignments_for),
 				title=_("Assigning Structures..."),
 			)
 		except Exception:
@@ -300,11 +376,13 @@ def create_salary_structure_assignment(
 	assignment = frappe.new_doc("Salary Structure Assignment")
 
 	if not payroll_payable_account:
-		payroll_payable_account = frappe.db.get_value("Company", company, "default_payroll_payable_account")
+		payroll_payable_account = frappe.get_cached_value(
+			"Company", company, "default_payroll_payable_account"
+		)
 		if not payroll_payable_account:
 			frappe.throw(_('Please set "Default Payroll Payable Account" in Company Defaults'))
 
-	payroll_payable_account_currency = frappe.db.get_value(
+	payroll_payable_account_currency = frappe.get_cached_value(
 		"Account", payroll_payable_account, "account_currency"
 	)
 	company_curency = erpnext.get_company_currency(company)
@@ -331,20 +409,27 @@ def create_salary_structure_assignment(
 
 
 def get_existing_assignments(employees, salary_structure, from_date):
-	# nosemgrep: frappe-semgrep-rules.rules.frappe-using-db-sql
-	salary_structures_assignments = frappe.db.sql_list(
-		f"""
-		SELECT DISTINCT employee FROM `tabSalary Structure Assignment`
-		WHERE salary_structure=%s AND employee IN ({", ".join(["%s"] * len(employees))})
-		AND from_date=%s AND company=%s AND docstatus=1
-		""",
-		[salary_structure.name, *employees, from_date, salary_structure.company],
+	"""Return the set of employees that already have a submitted assignment,
+	allowing O(1) membership checks by the assignment loop."""
+	salary_structures_assignments = set(
+		frappe.get_all(
+			"Salary Structure Assignment",
+			filters={
+				"salary_structure": salary_structure.name,
+				"employee": ("in", employees),
+				"from_date": from_date,
+				"company": salary_structure.company,
+				"docstatus": 1,
+			},
+			pluck="employee",
+			distinct=True,
+		)
 	)
 	if salary_structures_assignments:
 		frappe.msgprint(
 			_(
 				"Skipping Salary Structure Assignment for the following employees, as Salary Structure Assignment records already exists against them. {0}"
-			).format("\n".join(salary_structures_assignments))
+			).format("\n".join(sorted(salary_structures_assignments)))
 		)
 	return salary_structures_assignments
 
@@ -401,6 +486,7 @@ def get_employees(salary_structure):
 		"Salary Structure Assignment",
 		filters={"salary_structure": salary_structure, "docstatus": 1},
 		pluck="employee",
+		distinct=True,
 	)
 
 	if not employees:
@@ -410,7 +496,7 @@ def get_employees(salary_structure):
 			).format(salary_structure, salary_structure)
 		)
 
-	return list(set(employees))
+	return employees
 
 
 @frappe.whitelist()
@@ -427,17 +513,12 @@ def get_salary_component(doctype, txt, searchfield, start, page_len, filters):
 			(sc.type == filters.get("component_type"))
 			& (sc.disabled == 0)
 			& (sc[searchfield].like(f"%{txt}%") | sc.name.like(f"%{txt}%"))
+			# filter in the query so LIMIT returns a full page instead of
+			# dropping other companies' rows after pagination
+			& (sca.company.isnull() | (sca.company == filters.get("company")))
 		)
 		.limit(page_len)
 		.offset(start)
 	).run(as_dict=True)
 
-	accounts = []
-	for component in salary_components:
-		if not component.company:
-			accounts.append((component.name, component.account, component.company))
-		else:
-			if component.company == filters["company"]:
-				accounts.append((component.name, component.account, component.company))
-
-	return accounts
+	return [(component.name, component.account, component.company) for component in salary_components]